@@ -1,74 +1,40 @@
+import io
+import math
 from dataclasses import dataclass, field
+from typing import Any, Callable
 
 import numpy as np
 import matplotlib.pyplot as plt
 import matplotlib.animation as animation
-from matplotlib.patches import Rectangle
 from matplotlib.artist import Artist
-from matplotlib.lines import Line2D
+from matplotlib.collections import LineCollection, PolyCollection
 from matplotlib.text import Text as TextAnnotation
 
-EPS = 1e-4
-
-
-@dataclass
-class Vec2D:
-    """Represents a 2D vector or point."""
-
-    x: float = 0.0
-    y: float = 0.0
+try:
+    from numba import njit, prange
 
-    def as_tuple(self) -> tuple[float, float]:
-        return (self.x, self.y)
+    HAS_NUMBA = True
+except ImportError:
+    HAS_NUMBA = False
+    prange = range  # type: ignore[misc]
 
-    def copy(self) -> "Vec2D":
-        return Vec2D(self.x, self.y)
+    def njit(*args: Any, **kwargs: Any) -> Callable[[Any], Any]:  # type: ignore[no-redef]
+        """Stand-in for numba.njit, leaves the function as it is."""
 
-    def add(self, other: "Vec2D") -> "Vec2D":
-        self.x += other.x
-        self.y += other.y
-        return self
+        def decorator(func: Any) -> Any:
+            return func
 
-    def scale(self, alpha: float) -> "Vec2D":
-        self.x *= alpha
-        self.y *= alpha
-        return self
-
-    def l2norm(self) -> float:
-        result: float = (self.x * self.x + self.y * self.y) ** 0.5
-        return result
-
-    @staticmethod
-    def random() -> "Vec2D":
-        x, y = np.random.rand(2)
-        return Vec2D(x, y)
+        return decorator
 
 
-@dataclass
-class RectBox:
-    """Specification for a rectangle."""
-
-    position: Vec2D
-    velocity: Vec2D
-    acceleration: Vec2D
-    shape: Vec2D
-    force: Vec2D = field(default_factory=Vec2D)
-
-    def get_center(self) -> Vec2D:
-        """Returns the center coordinates of the rectangle."""
-        center_x = self.position.x + self.shape.x / 2
-        center_y = self.position.y + self.shape.y / 2
-        return Vec2D(center_x, center_y)
-
-    def is_overlapping(self, other: "RectBox") -> bool:
-        # Check for overlap
-        is_overlapping = not (
-            self.position.x + self.shape.x < other.position.x
-            or self.position.x > other.position.x + other.shape.x
-            or self.position.y + self.shape.y < other.position.y
-            or self.position.y > other.position.y + other.shape.y
-        )
-        return is_overlapping
+EPS = 1e-4
+EPS2 = EPS * EPS
+# Precision of the simulation state. The explicit Euler steps are tolerant to
+# rounding, and single precision halves the memory each pass touches.
+DTYPE = np.float32
+# Largest graph for which a repulsion kernel is generated, see
+# make_unrolled_repulsion. Beyond this the NumPy pass is faster.
+UNROLL_MAX_NODES = 16
 
 
 @dataclass
@@ -86,7 +52,9 @@ Connections = list[tuple[int, int]]
 
 
 def extract_connections(graph: Graph) -> tuple[Connections, Connections]:
-    unique_connections: set[tuple[int, int]] = set()
+    num_nodes = len(graph)
+    sources: list[int] = []
+    destinations: list[int] = []
     dependencies: set[tuple[int, int]] = set()
     for node_id, node in enumerate(graph):
         if node.node_id != node_id:
@@ -94,14 +62,21 @@ def extract_connections(graph: Graph) -> tuple[Connections, Connections]:
         for relative in node.related_to:
             smaller = min(node_id, relative)
             bigger = max(node_id, relative)
-            unique_connections.add((smaller, bigger))
-            if bigger >= len(graph):
+            if bigger >= num_nodes:
                 raise ValueError(f"node_id {bigger} has no Node defined")
+            sources.append(smaller)
+            destinations.append(bigger)
         for dependency in node.depends_on:
-            if dependency >= len(graph):
+            if dependency >= num_nodes:
                 raise ValueError(f"{dependency=} does not exist ({node_id=})")
             dependencies.add((node_id, dependency))
-    return sorted(list(unique_connections)), list(dependencies)
+
+    # Sorting the (smaller, bigger) pairs by a combined key removes duplicates
+    src = np.array(sources, dtype=np.int64)
+    dst = np.array(destinations, dtype=np.int64)
+    _, first = np.unique(src * num_nodes + dst, return_index=True)
+    unique_connections = list(zip(src[first].tolist(), dst[first].tolist()))
+    return unique_connections, list(dependencies)
 
 
 def create_test_graph() -> Graph:
@@ -139,21 +114,459 @@ class Config:
     canvas_size: float = 20
     time_step: float = 0.1
     mass: float = 1
+    # Barnes-Hut opening angle for repulsion. 0 computes every pair exactly.
+    # Needs numba, and only helps from a few hundred boxes.
+    theta: float = 0
+    # Pairs whose repulsion would be weaker than this are skipped, using a grid
+    # of cells. 0 computes every pair. Needs numba, and only helps when the
+    # layout spans many cutoff radii. Cannot be combined with theta.
+    repulsion_cutoff_force: float = 0
 
 
-def get_starting_positions(separation: float, num_nodes: int) -> list[Vec2D]:
+def get_starting_positions(separation: float, num_nodes: int) -> np.ndarray:
+    """Returns (N, 2) points on a circle, in random order."""
     angles = np.arange(num_nodes) * (2 * np.pi / num_nodes)
-    result = []
-    for angle in angles:
-        position = Vec2D(x=separation * np.cos(angle), y=separation * np.sin(angle))
-        result.append(position)
-    np.random.shuffle(result)  # type: ignore
+    result = np.column_stack([np.cos(angles), np.sin(angles)]) * separation
+    np.random.shuffle(result)
     return result
 
 
-def get_random_unit_vector() -> Vec2D:
-    angle = np.random.uniform(0, 2 * np.pi)
-    return Vec2D(np.cos(angle), np.sin(angle))
+def _level_pair(y_child: float, y_parent: float, coef: float, offset: float) -> float:
+    """Vertical force on a child box due to its parent."""
+    y_diff = y_child - (y_parent + offset)
+    if y_diff < 0:
+        return -coef * min(-y_diff, 1)
+    return 0.0
+
+
+def make_unrolled_repulsion(num_nodes: int) -> Callable[..., list[float]]:
+    """
+    Generates a repulsion kernel specialized to the number of nodes.
+
+    The loop over the pairs is fully unrolled into straight-line code on
+    local variables. The kernel takes the centers flattened as
+    [x0, y0, x1, y1, ...], the box bounds and the coefficients as plain
+    Python values, and returns the forces flattened the same way. The
+    x scaling is left to the caller.
+    """
+    src = io.StringIO()
+    src.write("def kernel(centers, lo_x, lo_y, hi_x, hi_y, coef, overlap_scale):\n")
+    if num_nodes < 2:
+        src.write(f"    return [0.0] * {2 * num_nodes}\n")
+    else:
+        nodes = range(num_nodes)
+        src.write("    " + ", ".join(f"x{i}, y{i}" for i in nodes) + ", = centers\n")
+        for name in ["lo_x", "lo_y", "hi_x", "hi_y"]:
+            local = "".join(part[0] for part in name.split("_"))
+            src.write(
+                "    " + ", ".join(f"{local}{i}" for i in nodes) + f", = {name}\n"
+            )
+        for i in nodes:
+            src.write(f"    fx{i} = fy{i} = 0.0\n")
+
+        for i in nodes:
+            for j in range(i + 1, num_nodes):
+                src.write(
+                    f"    dx = x{i} - x{j}\n"
+                    f"    dy = y{i} - y{j}\n"
+                    f"    dist2 = dx * dx + dy * dy\n"
+                    f"    if dist2 < {EPS2!r}:\n"
+                    f"        dist2 = {EPS2!r}\n"
+                    f"    magnitude = coef / (dist2 * sqrt(dist2))\n"
+                    f"    if not (hx{i} < lx{j} or lx{i} > hx{j}"
+                    f" or hy{i} < ly{j} or ly{i} > hy{j}):\n"
+                    f"        magnitude *= overlap_scale\n"
+                    f"    fx = dx * magnitude\n"
+                    f"    fy = dy * magnitude\n"
+                    f"    fx{i} += fx\n"
+                    f"    fy{i} += fy\n"
+                    f"    fx{j} -= fx\n"
+                    f"    fy{j} -= fy\n"
+                )
+        src.write("    return [" + ", ".join(f"fx{i}, fy{i}" for i in nodes) + "]\n")
+
+    namespace: dict[str, Any] = {"sqrt": math.sqrt}
+    code = compile(src.getvalue(), f"<repulsion kernel, {num_nodes} nodes>", "exec")
+    exec(code, namespace)
+    kernel: Callable[..., list[float]] = namespace["kernel"]
+    return kernel
+
+
+class QuadTree:
+    """
+    Barnes-Hut quadtree over a set of boxes, stored as flat arrays.
+
+    The tree splits on the box centers. Cell 0 is the root. For cell k,
+    child[k] holds the indices of the four sub-cells (-1 if missing), com[k]
+    and mass[k] the center of mass and the number of boxes inside, width[k]
+    the side length and extent[k] the (lo_x, lo_y, hi_x, hi_y) bounds of the
+    boxes. The boxes of the cell are order[start[k] : start[k] + count[k]].
+
+    The tree is built by the _build_quadtree kernel.
+    """
+
+    def __init__(
+        self,
+        points: np.ndarray,
+        lower: np.ndarray,
+        upper: np.ndarray,
+        min_width: float = EPS,
+    ) -> None:
+        num_points = len(points)
+        self.order = np.arange(num_points)
+        capacity = 4 * num_points + 1
+        while True:
+            self.center = np.zeros((capacity, 2))
+            self.child = np.full((capacity, 4), -1, dtype=np.int64)
+            self.com = np.zeros((capacity, 2))
+            self.mass = np.zeros(capacity)
+            self.width = np.zeros(capacity)
+            self.extent = np.zeros((capacity, 4))
+            self.start = np.zeros(capacity, dtype=np.int64)
+            self.count = np.zeros(capacity, dtype=np.int64)
+            self.depth = np.zeros(capacity, dtype=np.int64)
+            self.num_cells = _build_quadtree(
+                points,
+                lower,
+                upper,
+                self.order,
+                self.center,
+                self.child,
+                self.com,
+                self.mass,
+                self.width,
+                self.extent,
+                self.start,
+                self.count,
+                self.depth,
+                min_width,
+            )
+            if self.num_cells >= 0:
+                break
+            # Clustered points can need more cells than the initial estimate
+            capacity *= 2
+        self.max_depth = int(self.depth[: self.num_cells].max())
+
+
+# Force kernels compiled with numba. They operate on (N, 2) state arrays and
+# are only used when numba is available, except for the Barnes-Hut and cutoff
+# kernels that have no NumPy counterpart. The NumPy methods of GraphAnimation
+# are the reference implementation.
+
+
+@njit(cache=True, fastmath=True, parallel=True)
+def _repulsive(pos, shape, centers, force, coef, xscale, overlap_scale):  # type: ignore
+    num_nodes = pos.shape[0]
+    for i in prange(num_nodes):
+        lo_x = pos[i, 0]
+        lo_y = pos[i, 1]
+        hi_x = lo_x + shape[i, 0]
+        hi_y = lo_y + shape[i, 1]
+        cx = centers[i, 0]
+        cy = centers[i, 1]
+        fx = 0.0
+        fy = 0.0
+        for j in range(num_nodes):
+            if i == j:
+                continue
+            dx = cx - centers[j, 0]
+            dy = cy - centers[j, 1]
+            dist2 = max(dx * dx + dy * dy, EPS2)
+            inv_dist = 1.0 / math.sqrt(dist2)
+            magnitude = coef * inv_dist / dist2
+            overlapping = not (
+                hi_x < pos[j, 0]
+                or lo_x > pos[j, 0] + shape[j, 0]
+                or hi_y < pos[j, 1]
+                or lo_y > pos[j, 1] + shape[j, 1]
+            )
+            if overlapping:
+                magnitude *= overlap_scale
+            fx += dx * magnitude
+            fy += dy * magnitude
+        force[i, 0] += fx * xscale
+        force[i, 1] += fy
+
+
+@njit(cache=True)
+def _build_quadtree(  # type: ignore
+    points,
+    lower,
+    upper,
+    order,
+    center,
+    child,
+    com,
+    mass,
+    width,
+    extent,
+    start,
+    count,
+    depth,
+    min_width,
+):
+    """Fills the QuadTree arrays. Returns the number of cells, -1 if full."""
+    num_points = points.shape[0]
+    capacity = mass.shape[0]
+    lower_x = points[:, 0].min()
+    lower_y = points[:, 1].min()
+    root_width = max(points[:, 0].max() - lower_x, points[:, 1].max() - lower_y)
+    root_width += EPS
+    center[0, 0] = lower_x + root_width / 2
+    center[0, 1] = lower_y + root_width / 2
+    width[0] = root_width
+    start[0] = 0
+    count[0] = num_points
+    num_cells = 1
+
+    buffer = np.empty(num_points, np.int64)
+    quadrant = np.empty(num_points, np.int64)
+    stack = np.empty(capacity, np.int64)
+    stack[0] = 0
+    top = 1
+    while top > 0:
+        top -= 1
+        cell = stack[top]
+        first = start[cell]
+        last = first + count[cell]
+        sum_x = 0.0
+        sum_y = 0.0
+        extent[cell, 0] = np.inf
+        extent[cell, 1] = np.inf
+        extent[cell, 2] = -np.inf
+        extent[cell, 3] = -np.inf
+        for k in range(first, last):
+            idx = order[k]
+            sum_x += points[idx, 0]
+            sum_y += points[idx, 1]
+            extent[cell, 0] = min(extent[cell, 0], lower[idx, 0])
+            extent[cell, 1] = min(extent[cell, 1], lower[idx, 1])
+            extent[cell, 2] = max(extent[cell, 2], upper[idx, 0])
+            extent[cell, 3] = max(extent[cell, 3], upper[idx, 1])
+        mass[cell] = count[cell]
+        com[cell, 0] = sum_x / count[cell]
+        com[cell, 1] = sum_y / count[cell]
+        if count[cell] == 1 or width[cell] < min_width:
+            continue
+        if num_cells + 4 > capacity:
+            return -1
+
+        # Group the points of this cell by quadrant (counting sort)
+        sizes = np.zeros(4, np.int64)
+        for k in range(first, last):
+            q = 0
+            if points[order[k], 0] >= center[cell, 0]:
+                q += 1
+            if points[order[k], 1] >= center[cell, 1]:
+                q += 2
+            quadrant[k] = q
+            sizes[q] += 1
+        offsets = np.zeros(4, np.int64)
+        for q in range(1, 4):
+            offsets[q] = offsets[q - 1] + sizes[q - 1]
+        fill = offsets.copy()
+        for k in range(first, last):
+            buffer[first + fill[quadrant[k]]] = order[k]
+            fill[quadrant[k]] += 1
+        order[first:last] = buffer[first:last]
+
+        half = width[cell] / 2
+        for q in range(4):
+            if sizes[q] == 0:
+                continue
+            sub = num_cells
+            num_cells += 1
+            child[cell, q] = sub
+            start[sub] = first + offsets[q]
+            count[sub] = sizes[q]
+            width[sub] = half
+            center[sub, 0] = center[cell, 0] + ((q & 1) - 0.5) * half
+            center[sub, 1] = center[cell, 1] + ((q >> 1) - 0.5) * half
+            depth[sub] = depth[cell] + 1
+            stack[top] = sub
+            top += 1
+    return num_cells
+
+
+@njit(cache=True, fastmath=True, parallel=True)
+def _repulsive_barnes_hut(  # type: ignore
+    pos,
+    shape,
+    centers,
+    force,
+    child,
+    com,
+    mass,
+    width,
+    extent,
+    start,
+    count,
+    order,
+    max_depth,
+    coef,
+    xscale,
+    overlap_scale,
+    theta2,
+):
+    num_nodes = pos.shape[0]
+    for i in prange(num_nodes):
+        lo_x = pos[i, 0]
+        lo_y = pos[i, 1]
+        hi_x = lo_x + shape[i, 0]
+        hi_y = lo_y + shape[i, 1]
+        cx = centers[i, 0]
+        cy = centers[i, 1]
+        fx = 0.0
+        fy = 0.0
+        # Each visited cell replaces itself by at most 4 children
+        stack = np.empty(3 * max_depth + 4, np.int64)
+        stack[0] = 0
+        top = 1
+        while top > 0:
+            top -= 1
+            cell = stack[top]
+            is_leaf = (
+                child[cell, 0] < 0
+                and child[cell, 1] < 0
+                and child[cell, 2] < 0
+                and child[cell, 3] < 0
+            )
+            if is_leaf:
+                for k in range(start[cell], start[cell] + count[cell]):
+                    j = order[k]
+                    if j == i:
+                        continue
+                    dx = cx - centers[j, 0]
+                    dy = cy - centers[j, 1]
+                    dist2 = max(dx * dx + dy * dy, EPS2)
+                    magnitude = coef / (dist2 * math.sqrt(dist2))
+                    overlapping = not (
+                        hi_x < pos[j, 0]
+                        or lo_x > pos[j, 0] + shape[j, 0]
+                        or hi_y < pos[j, 1]
+                        or lo_y > pos[j, 1] + shape[j, 1]
+                    )
+                    if overlapping:
+                        magnitude *= overlap_scale
+                    fx += dx * magnitude
+                    fy += dy * magnitude
+                continue
+
+            dx = cx - com[cell, 0]
+            dy = cy - com[cell, 1]
+            dist2 = dx * dx + dy * dy
+            # Cells touching the box are opened, so overlaps stay exact
+            touching = not (
+                hi_x < extent[cell, 0]
+                or lo_x > extent[cell, 2]
+                or hi_y < extent[cell, 1]
+                or lo_y > extent[cell, 3]
+            )
+            if not touching and width[cell] * width[cell] < theta2 * dist2:
+                # Far enough away to act as a single body
+                dist2 = max(dist2, EPS2)
+                magnitude = coef * mass[cell] / (dist2 * math.sqrt(dist2))
+                fx += dx * magnitude
+                fy += dy * magnitude
+            else:
+                for q in range(4):
+                    if child[cell, q] >= 0:
+                        stack[top] = child[cell, q]
+                        top += 1
+        force[i, 0] += fx * xscale
+        force[i, 1] += fy
+
+
+@njit(cache=True, fastmath=True, parallel=True)
+def _repulsive_cutoff(  # type: ignore
+    pos,
+    shape,
+    centers,
+    force,
+    cells,
+    num_rows,
+    order,
+    sorted_keys,
+    coef,
+    xscale,
+    overlap_scale,
+    cutoff2,
+):
+    num_nodes = pos.shape[0]
+    for i in prange(num_nodes):
+        lo_x = pos[i, 0]
+        lo_y = pos[i, 1]
+        hi_x = lo_x + shape[i, 0]
+        hi_y = lo_y + shape[i, 1]
+        cx = centers[i, 0]
+        cy = centers[i, 1]
+        fx = 0.0
+        fy = 0.0
+        for near_x in range(cells[i, 0] - 1, cells[i, 0] + 2):
+            for near_y in range(cells[i, 1] - 1, cells[i, 1] + 2):
+                if near_y < 0 or near_y >= num_rows:
+                    continue
+                # Nodes of a cell are contiguous in order, sorted by key
+                key = near_x * num_rows + near_y
+                first = np.searchsorted(sorted_keys, key)
+                last = np.searchsorted(sorted_keys, key + 1)
+                for k in range(first, last):
+                    j = order[k]
+                    if j == i:
+                        continue
+                    dx = cx - centers[j, 0]
+                    dy = cy - centers[j, 1]
+                    dist2 = dx * dx + dy * dy
+                    if dist2 > cutoff2:
+                        continue
+                    dist2 = max(dist2, EPS2)
+                    magnitude = coef / (dist2 * math.sqrt(dist2))
+                    overlapping = not (
+                        hi_x < pos[j, 0]
+                        or lo_x > pos[j, 0] + shape[j, 0]
+                        or hi_y < pos[j, 1]
+                        or lo_y > pos[j, 1] + shape[j, 1]
+                    )
+                    if overlapping:
+                        magnitude *= overlap_scale
+                    fx += dx * magnitude
+                    fy += dy * magnitude
+        force[i, 0] += fx * xscale
+        force[i, 1] += fy
+
+
+@njit(cache=True, fastmath=True)
+def _attractive(pos, shape, centers, force, conn_src, conn_dst, coef):  # type: ignore
+    # Edges share nodes, so this loop is not parallelized
+    for k in range(conn_src.shape[0]):
+        i = conn_src[k]
+        j = conn_dst[k]
+        overlapping = not (
+            pos[i, 0] + shape[i, 0] < pos[j, 0]
+            or pos[i, 0] > pos[j, 0] + shape[j, 0]
+            or pos[i, 1] + shape[i, 1] < pos[j, 1]
+            or pos[i, 1] > pos[j, 1] + shape[j, 1]
+        )
+        if overlapping:
+            # This includes coinciding centers, as in the NumPy pass
+            continue
+        # Spring with zero rest length: -coef * (c_i - c_j)
+        fx = -coef * (centers[i, 0] - centers[j, 0])
+        fy = -coef * (centers[i, 1] - centers[j, 1])
+        force[i, 0] += fx
+        force[i, 1] += fy
+        force[j, 0] -= fx
+        force[j, 1] -= fy
+
+
+@njit(cache=True, fastmath=True)
+def _integrate(pos, vel, acc, force, slowing_coef, dt, mass, limit):  # type: ignore
+    for i in range(pos.shape[0]):
+        for k in range(2):
+            force[i, k] -= slowing_coef * vel[i, k]
+            acc[i, k] = force[i, k] / mass
+            vel[i, k] += acc[i, k] * dt
+            pos[i, k] = min(max(pos[i, k] + vel[i, k] * dt, -limit), limit)
 
 
 class GraphAnimation:
@@ -164,6 +577,8 @@ class GraphAnimation:
         connections: Connections,
         dependencies: Connections,
     ) -> None:
+        if config.theta > 0 and config.repulsion_cutoff_force > 0:
+            raise ValueError("theta and repulsion_cutoff_force are exclusive")
         self.config = config
         self.graph = graph
         self.connections = connections
@@ -171,45 +586,50 @@ class GraphAnimation:
 
         max_width = max(config.box_width, config.box_height)
         separation = 2 * len(graph) * max_width / (2 * np.pi)
-        self.node_boxes = self.create_inital_rectangles(
-            separation, len(graph), config.box_width, config.box_height
+
+        # Simulation state, one (N, 2) array per quantity
+        num_nodes = len(graph)
+        self.create_inital_rectangles(
+            separation, num_nodes, config.box_width, config.box_height
         )
+        self.vel = np.zeros((num_nodes, 2), dtype=DTYPE)
+        self.acc = np.zeros((num_nodes, 2), dtype=DTYPE)
+        self.force = np.zeros((num_nodes, 2), dtype=DTYPE)
+        self.conn_src = np.array([src for src, _ in connections], dtype=np.int64)
+        self.conn_dst = np.array([dst for _, dst in connections], dtype=np.int64)
+        # Every unordered pair of nodes, for the vectorized repulsion
+        self.pair_first, self.pair_second = np.triu_indices(num_nodes, k=1)
+        # Without numba, small graphs use a generated straight-line kernel
+        self.unrolled_repulsion: Callable[..., list[float]] | None = None
+        if not HAS_NUMBA and num_nodes <= UNROLL_MAX_NODES:
+            self.unrolled_repulsion = make_unrolled_repulsion(num_nodes)
+        # Box centers and bounds for the current step, see update_geometry
+        self.update_geometry()
 
         self.fig, self.ax = plt.subplots(figsize=(7, 7))
 
-        self.lines: list[Line2D] = []
-
-        for src_idx, dst_idx in self.connections:
-            src_pos = self.node_boxes[src_idx].get_center()
-            dst_pos = self.node_boxes[dst_idx].get_center()
-            (line,) = self.ax.plot(
-                [src_pos.x, dst_pos.x],
-                [src_pos.y, dst_pos.y],
-                "k-",
-                lw=2,
-            )
-            self.lines.append(line)
+        # All the edges are drawn as a single artist
+        self.edge_lines = LineCollection(
+            self.get_edge_segments(self.centers),  # type: ignore[arg-type]
+            colors="k",
+            linewidths=2,
+        )
+        self.ax.add_collection(self.edge_lines)
+
+        # Likewise, all the boxes are drawn as a single artist
+        self.box_polygons = PolyCollection(
+            self.get_box_vertices(),  # type: ignore[arg-type]
+            facecolors=config.box_color,
+            edgecolors=config.box_color,
+            zorder=2,
+        )
+        self.ax.add_collection(self.box_polygons)
 
-        self.rect_patches: list[Rectangle] = []
         self.annotations: list[TextAnnotation] = []
-        for node_id, rect in enumerate(self.node_boxes):
-            rect_patch = Rectangle(
-                (rect.position.x, rect.position.y),
-                rect.shape.x,
-                rect.shape.y,
-                angle=0,
-                color=config.box_color,
-                fill=True,
-                zorder=2,
-            )
-            self.ax.add_patch(rect_patch)
-            self.rect_patches.append(rect_patch)
-
+        for node_id, position in enumerate(self.pos):
             # label = str(graph[node_id].level)
             label = str(node_id)
-            text = self.ax.annotate(
-                label, (rect.position.x, rect.position.y), fontsize=12, color="white"
-            )
+            text = self.ax.annotate(label, tuple(position), fontsize=12, color="white")
             self.annotations.append(text)
 
         self.ax.set_xlim(-config.canvas_size, config.canvas_size)
@@ -219,173 +639,296 @@ class GraphAnimation:
 
     def create_inital_rectangles(
         self, separation: float, num_nodes: int, width: float, height: float
-    ) -> list[RectBox]:
-        positions = get_starting_positions(separation, num_nodes)
-        rectangles: list[RectBox] = []
-        for position in positions:
-            position.x -= width / 2
-            position.y -= height / 2
-            rect = RectBox(
-                position=position,
-                velocity=Vec2D(),
-                acceleration=Vec2D(),
-                shape=Vec2D(x=width, y=height),
-            )
-            rectangles.append(rect)
-        return rectangles
+    ) -> None:
+        """Sets pos and shape for boxes centered on the starting positions."""
+        self.shape = np.tile([width, height], (num_nodes, 1)).astype(DTYPE)
+        self.pos = get_starting_positions(separation, num_nodes).astype(DTYPE)
+        self.pos -= self.shape / 2
+
+    def get_centers(self) -> np.ndarray:
+        """Returns the center coordinates of all the rectangles."""
+        result: np.ndarray = self.pos + self.shape / 2
+        return result
+
+    def get_box_vertices(self) -> np.ndarray:
+        """Returns the (N, 4, 2) corners of all the boxes."""
+        vertices = np.empty((len(self.pos), 4, 2))
+        vertices[:, 0, :] = self.pos
+        vertices[:, 1, 0] = self.pos[:, 0] + self.shape[:, 0]
+        vertices[:, 1, 1] = self.pos[:, 1]
+        vertices[:, 2, :] = self.pos + self.shape
+        vertices[:, 3, 0] = self.pos[:, 0]
+        vertices[:, 3, 1] = self.pos[:, 1] + self.shape[:, 1]
+        return vertices
+
+    def get_edge_segments(self, centers: np.ndarray) -> np.ndarray:
+        """Returns the (E, 2, 2) start and end points of all the edges."""
+        segments = np.empty((len(self.conn_src), 2, 2))
+        segments[:, 0, :] = centers[self.conn_src]
+        segments[:, 1, :] = centers[self.conn_dst]
+        return segments
+
+    def update_geometry(self) -> None:
+        """Caches the centers and the bounding boxes for the current positions."""
+        self.centers = self.get_centers()
+        hi = self.pos + self.shape
+        self.lo_x = self.pos[:, 0].copy()
+        self.lo_y = self.pos[:, 1].copy()
+        self.hi_x = hi[:, 0]
+        self.hi_y = hi[:, 1]
 
     def clear_force_all(self) -> None:
-        for rect in self.node_boxes:
-            rect.force = Vec2D()
+        self.force.fill(0)
+
+    def add_pair_forces(
+        self, first: np.ndarray, second: np.ndarray, force: np.ndarray
+    ) -> None:
+        """Adds force[k] to node first[k] and subtracts it from node second[k]."""
+        # bincount sums repeated indices in a single pass, unlike np.add.at
+        num_nodes = len(self.force)
+        for axis in range(2):
+            added = np.bincount(first, force[:, axis], num_nodes)
+            removed = np.bincount(second, force[:, axis], num_nodes)
+            self.force[:, axis] += added - removed
 
-    def compute_coloumb_repulsive_force(self, b1: RectBox, b2: RectBox) -> Vec2D:
+    def compute_repulsive_all(self) -> None:
         """
-        Compute force on b1 due to b2.
+        Every node repel every other node.
+        Repulsion is increased if the nodes overlap.
 
-        Force on b2 due to b1 is the exact opposite.
+        The NumPy pass computes all pairs i < j at once. The force on j due
+        to i is the opposite of the force on i due to j, so there each pair is
+        evaluated once. The numba kernel instead visits every j != i for each
+        row, so that rows can run in parallel.
         """
         coef = self.config.repulsion_coef
         xscale = self.config.repulsion_xscale
         overlap_scale = self.config.overlap_scale
 
-        p1 = b1.get_center().copy()
-        p2 = b2.get_center().copy()
-
-        diff = p1.add(p2.scale(-1))  # p1 - p2
-        diff_norm = diff.l2norm()
-        if diff_norm < EPS:
-            diff_norm = EPS
-        diff_unit = diff.scale(1 / diff_norm)
-
-        force_magnitude = coef / (diff_norm**2)
-        if b1.is_overlapping(b2):
-            force_magnitude *= overlap_scale
+        if self.config.theta > 0:
+            self.compute_repulsive_barnes_hut()
+            return
+
+        if self.config.repulsion_cutoff_force > 0:
+            self.compute_repulsive_cutoff()
+            return
+
+        if HAS_NUMBA:
+            _repulsive(
+                self.pos,
+                self.shape,
+                self.centers,
+                self.force,
+                DTYPE(coef),
+                DTYPE(xscale),
+                DTYPE(overlap_scale),
+            )
+            return
+
+        if self.unrolled_repulsion is not None:
+            forces = self.unrolled_repulsion(
+                self.centers.ravel().tolist(),
+                self.lo_x.tolist(),
+                self.lo_y.tolist(),
+                self.hi_x.tolist(),
+                self.hi_y.tolist(),
+                coef,
+                overlap_scale,
+            )
+            total = np.array(forces, dtype=DTYPE).reshape(-1, 2)
+            total[:, 0] *= xscale
+            self.force += total
+            return
+
+        first = self.pair_first
+        second = self.pair_second
+        diff = self.centers[first] - self.centers[second]
+        dist2 = np.einsum("ij,ij->i", diff, diff)
+        np.maximum(dist2, EPS2, out=dist2)
+
+        overlap = (
+            (self.hi_x[first] >= self.lo_x[second])
+            & (self.lo_x[first] <= self.hi_x[second])
+            & (self.hi_y[first] >= self.lo_y[second])
+            & (self.lo_y[first] <= self.hi_y[second])
+        )
+        # coef / dist^2 along the unit vector diff / dist
+        magnitude = np.where(overlap, DTYPE(coef * overlap_scale), DTYPE(coef)) / (
+            dist2 * np.sqrt(dist2)
+        )
+        force = diff * magnitude[:, None]
+        force[:, 0] *= xscale
+        self.add_pair_forces(first, second, force)
 
-        force_vec = diff_unit.scale(force_magnitude)
-        force_vec.x *= xscale
-        return force_vec
+    def compute_repulsive_barnes_hut(self) -> None:
+        """
+        Approximate repulsion using a quadtree over the box centers.
 
-    def compute_repulsive_all(self) -> None:
+        A cell that is far enough away (width / distance < theta) acts on a
+        node as a single body of its total mass placed at its center of mass.
+        Boxes inside the same leaf, or in a cell overlapping the node's box,
+        interact exactly.
         """
-        Every node repel every other node.
-        Repulsion is increased if the nodes overlap.
+        tree = QuadTree(self.centers, self.pos, self.pos + self.shape)
+        _repulsive_barnes_hut(
+            self.pos,
+            self.shape,
+            self.centers,
+            self.force,
+            tree.child,
+            tree.com,
+            tree.mass,
+            tree.width,
+            tree.extent,
+            tree.start,
+            tree.count,
+            tree.order,
+            tree.max_depth,
+            DTYPE(self.config.repulsion_coef),
+            DTYPE(self.config.repulsion_xscale),
+            DTYPE(self.config.overlap_scale),
+            DTYPE(self.config.theta**2),
+        )
+
+    def compute_repulsive_cutoff(self) -> None:
         """
-        for src_idx in range(len(self.graph)):
-            for dst_idx in range(src_idx + 1, len(self.graph)):
-                src_box = self.node_boxes[src_idx]
-                dst_box = self.node_boxes[dst_idx]
+        Repulsion limited to pairs closer than a cutoff radius.
 
-                src_force = self.compute_coloumb_repulsive_force(src_box, dst_box)
-                dst_force = src_force.copy().scale(-1)
-                src_box.force.add(src_force)
-                dst_box.force.add(dst_force)
+        The radius is where the strongest component of the force,
+        max(xscale, 1) * coef / r^2, falls to repulsion_cutoff_force. Boxes
+        are bucketed into square cells of that size, so each node only visits
+        its own and the 8 neighbouring cells.
+        """
+        coef = self.config.repulsion_coef
+        xscale = self.config.repulsion_xscale
+        cutoff = math.sqrt(max(xscale, 1) * coef / self.config.repulsion_cutoff_force)
+
+        cells = np.floor(self.centers / cutoff).astype(np.int64)
+        cells -= cells.min(axis=0)
+        num_rows = int(cells[:, 1].max()) + 1
+        keys = cells[:, 0] * num_rows + cells[:, 1]
+        order = np.argsort(keys, kind="stable")
+        _repulsive_cutoff(
+            self.pos,
+            self.shape,
+            self.centers,
+            self.force,
+            cells,
+            num_rows,
+            order,
+            keys[order],
+            DTYPE(coef),
+            DTYPE(xscale),
+            DTYPE(self.config.overlap_scale),
+            DTYPE(cutoff * cutoff),
+        )
 
-    def compute_level_force(self, child: RectBox, parent: RectBox) -> Vec2D:
+    def compute_level_force_all(self) -> None:
+        """Children are pushed below their parents."""
+        # Config and positions are read once, not per dependency
         coef = self.config.level_coef
         offset = self.config.level_offset
-        y_child = child.position.y
-        y_parent = parent.position.y
-        y_diff = y_child - (y_parent + offset)
-        force = 0.0
-        if y_diff < 0:
-            force = coef * min(abs(y_diff), 1)
-        result = Vec2D(0, -force)
-        return result
-
-    def compute_level_force_all(self) -> None:
+        y = self.pos[:, 1].tolist()
+        force_y = [0.0] * len(y)
         for child_idx, parent_idx in self.dependencies:
-            child_box = self.node_boxes[child_idx]
-            parent_box = self.node_boxes[parent_idx]
-            child_force = self.compute_level_force(child_box, parent_box)
-            parent_force = child_force.copy().scale(-1)
-            child_box.force.add(child_force)
-            parent_box.force.add(parent_force)
+            child_force = _level_pair(y[child_idx], y[parent_idx], coef, offset)
+            force_y[child_idx] += child_force
+            force_y[parent_idx] -= child_force
+        self.force[:, 1] += force_y
 
-    def compute_attractive_force(self, b1: RectBox, b2: RectBox) -> Vec2D:
-        if b1.is_overlapping(b2):
-            return Vec2D()
+    def compute_attractive_all(self) -> None:
+        """
+        Connected nodes attract each other, unless they overlap.
 
+        All edges are computed at once by gathering the centers of both ends.
+        """
         coef = self.config.attraction_coef
+        if HAS_NUMBA:
+            _attractive(
+                self.pos,
+                self.shape,
+                self.centers,
+                self.force,
+                self.conn_src,
+                self.conn_dst,
+                DTYPE(coef),
+            )
+            return
+
+        src = self.conn_src
+        dst = self.conn_dst
+        overlap = (
+            (self.hi_x[src] >= self.lo_x[dst])
+            & (self.lo_x[src] <= self.hi_x[dst])
+            & (self.hi_y[src] >= self.lo_y[dst])
+            & (self.lo_y[src] <= self.hi_y[dst])
+        )
+        diff = self.centers[src] - self.centers[dst]
+        # Boxes whose centers (nearly) coincide always overlap, so no edge
+        # needs a fallback direction for a zero-length spring
+        force = -coef * diff
+        force[overlap] = 0
 
-        p1 = b1.get_center().copy()
-        p2 = b2.get_center().copy()
-
-        diff = p1.add(p2.scale(-1))  # p1 - p2
-        diff_norm = diff.l2norm()
-        if diff_norm < EPS:
-            diff_norm = EPS
-        diff_unit = diff.scale(1 / diff_norm)
-        if diff_norm <= EPS:
-            diff_unit = get_random_unit_vector()
-
-        force_magnitude = coef * diff_norm
-        force_vec = diff_unit.scale(-force_magnitude)
-        return force_vec
-
-    def compute_attractive_all(self) -> None:
-        # TODO: cleanup repeated code!
-        for src_idx, dst_idx in self.connections:
-            src_box = self.node_boxes[src_idx]
-            dst_box = self.node_boxes[dst_idx]
-            src_force = self.compute_attractive_force(src_box, dst_box)
-            dst_force = src_force.copy().scale(-1)
-            src_box.force.add(src_force)
-            dst_box.force.add(dst_force)
-
-    def compute_slowing_all(self) -> None:
-        coef = self.config.slowing_coef
-        for box in self.node_boxes:
-            veclocity = box.velocity
-            norm = veclocity.l2norm()
-            if norm < EPS:
-                norm = EPS
-            veclocity_unit = veclocity.copy().scale(1 / norm)
-            force_magnitude = coef * norm
-            force_vec = veclocity_unit.scale(-force_magnitude)
-            box.force.add(force_vec)
+        self.add_pair_forces(src, dst, force)
 
     def update_position_all(self) -> None:
+        """
+        Applies the slowing force and moves the nodes by one time step.
+
+        The slowing force is against the velocity and proportional to the
+        speed. It is added here so the state is only walked once per step.
+        """
+        slowing_coef = self.config.slowing_coef
         time_step = self.config.time_step
         mass = self.config.mass
         limit = self.config.canvas_size - 2
-        for box in self.node_boxes:
-            box.acceleration = box.force.scale(1 / mass)
-            box.velocity.add(box.acceleration.copy().scale(time_step))
-            box.position.add(box.velocity.copy().scale(time_step))
-            box.position.x = max(-limit, min(limit, box.position.x))
-            box.position.y = max(-limit, min(limit, box.position.y))
+        if HAS_NUMBA:
+            _integrate(
+                self.pos,
+                self.vel,
+                self.acc,
+                self.force,
+                DTYPE(slowing_coef),
+                DTYPE(time_step),
+                DTYPE(mass),
+                DTYPE(limit),
+            )
+            return
+
+        self.force -= slowing_coef * self.vel
+        np.divide(self.force, mass, out=self.acc)
+        self.vel += time_step * self.acc
+        self.pos += time_step * self.vel
+        np.clip(self.pos, -limit, limit, out=self.pos)
 
     def run_simulation(self) -> None:
         """Update node positions"""
+        self.update_geometry()
         self.clear_force_all()
         self.compute_repulsive_all()
         self.compute_level_force_all()
         self.compute_attractive_all()
-        self.compute_slowing_all()
         self.update_position_all()
 
     def update_patches(self) -> None:
-        for box, rect, text in zip(
-            self.node_boxes, self.rect_patches, self.annotations
-        ):
-            rect.set_xy((box.position.x, box.position.y))
-            text.set_position((box.position.x, box.position.y))
-
-        for conn, line in zip(self.connections, self.lines):
-            src_idx, dst_idx = conn
-            x1, y1 = self.node_boxes[src_idx].get_center().as_tuple()
-            x2, y2 = self.node_boxes[dst_idx].get_center().as_tuple()
-            line.set_data([x1, x2], [y1, y2])
+        self.box_polygons.set_verts(self.get_box_vertices())  # type: ignore[arg-type]
+        for position, text in zip(self.pos, self.annotations):
+            text.set_position(tuple(position))
+
+        segments = self.get_edge_segments(self.get_centers())
+        self.edge_lines.set_segments(segments)  # type: ignore[arg-type]
 
     def animate(self, i: int) -> list[Artist]:
         self.run_simulation()
         self.update_patches()
-        result: list[Artist] = [*self.rect_patches, *self.lines]
+        # With blitting, only the artists returned here are redrawn, in this
+        # order for equal zorder. Edges go first so the boxes cover them.
+        result: list[Artist] = [self.edge_lines, self.box_polygons, *self.annotations]
         return result
 
     def start_animation(self) -> None:
         _anim = animation.FuncAnimation(
-            self.fig, self.animate, frames=1000000, interval=10
+            self.fig, self.animate, frames=1000000, interval=10, blit=True
         )
         plt.show()
 